@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
+from contextlib import contextmanager
 from datetime import date, timedelta
-from sqlalchemy import text
+from sqlalchemy import Connection, text
 import plotly.express as px
 import plotly.graph_objects as go
 import uuid
@@ -10,39 +11,75 @@ import uuid
 # CONFIG
 # =============================================================================
 
-TEAM_OPTIONS = ["Screenprint", "Embroidery", "Digital", "VAS"]
+TEAM_OPTIONS = ("Screenprint", "Embroidery", "Digital", "VAS")
 
-PROBLEM_TYPES = [
+# Dropdown option lists with their placeholder entry, built once at import
+TEAM_NAME_OPTIONS = ("-- Auto: Receiving --", *TEAM_OPTIONS)
+TEAM_FILTER_OPTIONS = ("-- All --", *TEAM_OPTIONS)
+
+PROBLEM_TYPES = (
     "Damaged in Production",
     "Short/ Heavy Items",
     "Factory Damage",
-]
+)
 
-SIZE_OPTIONS = [
+SIZE_OPTIONS = (
     "2T", "3T", "4T", "5/6T",
     "YXS", "YS", "YM", "YL", "YXL",
     "XS", "S", "M", "L", "XL", "2XL", "3XL",
     "OTHER",
-]
+)
 
-SHORT_HEAVY_OPTIONS = [
+SHORT_HEAVY_OPTIONS = (
     "",
     "Short",
     "Heavy",
     "Short/Heavy",
-]
+)
 
 # mapping used for main problem type vs lines' short/heavy tag (when the issue is short/heavy)
-SHORT_HEAVY_LINE_PROBLEM_TYPES = [
+SHORT_HEAVY_LINE_PROBLEM_TYPES = (
     "Short/ Heavy Items",
-]
+)
 
 # PRESET COLORS
-COLOR_MATCH_OPTIONS = [
+COLOR_MATCH_OPTIONS = (
     "",
     "Matches Packing Slip",
     "Does Not Match Packing Slip",
-]
+)
+
+# Max customers sent to the Customer Name dropdown; type in the search box to narrow further
+CUSTOMER_DROPDOWN_LIMIT = 50
+
+# Rows fetched per "Load more" click on the Recent Entries table
+RECENT_ENTRIES_PAGE_SIZE = 50
+
+# Days of daily actuals in the Receiving Data CSV export (independent of loaded pages)
+EXPORT_WINDOW_DAYS = 120
+
+# Analytics "Sort charts by" choices -> (sort columns, ascending) for the per-customer aggregate
+CUSTOMER_SORT_ORDER = {
+    "Highest error rate": (["error_rate", "customer_name"], [False, True]),
+    "Most error units": (["error_units", "customer_name"], [False, True]),
+    "Most problem tags": (["orders_with_issue", "customer_name"], [False, True]),
+    "Customer name": (["customer_name"], [True]),
+}
+
+# Customers drawn per Analytics bar chart (in the chosen sort order); the rest are listed below
+CHART_CUSTOMER_LIMIT = 30
+
+# Low-cardinality text columns stored as category codes in analytics frames
+CATEGORY_COLUMNS = ("team_name", "problem_type", "customer_name")
+
+
+def _psycopg_url(db_url: str) -> str:
+    """Point plain postgres URLs at the psycopg (v3) driver."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if db_url.startswith(prefix):
+            return "postgresql+psycopg://" + db_url[len(prefix):]
+    return db_url
+
 
 # caching DB URL
 @st.cache_resource
@@ -62,7 +99,23 @@ def get_engine():
             "/neondb?sslmode=require&channel_binding=require"
         )
 
-    engine = create_engine(db_url, pool_pre_ping=True)
+    # Pool sized for several concurrent Streamlit sessions; hand out the most recently
+    # used (still warm) connection first. Neon suspends idle computes after ~5 min, the
+    # same as pool_recycle, so there is no margin: pre-ping catches connections the
+    # server has already dropped instead of surfacing an OperationalError on the page.
+    # prepare_threshold=None: pooled connections are reset with a ROLLBACK on return,
+    # which DEALLOCATEs everything, so server-side prepares never pay off (and Neon's
+    # -pooler endpoint is PgBouncer in transaction mode).
+    engine = create_engine(
+        _psycopg_url(db_url),
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=300,
+        pool_use_lifo=True,
+        pool_pre_ping=True,
+        connect_args={"prepare_threshold": None},
+    )
     return engine
 
 
@@ -70,106 +123,286 @@ def get_engine():
 # DB HELPERS
 # =============================================================================
 
+# receiving_problem_lines columns supplied per line by save_problem_tag callers
+LINE_COLUMNS = (
+    "short_heavy_tag",
+    "style_number",
+    "item_description",
+    "color",
+    "size",
+    "vendor_packing_slip_matches",
+    "qty_short",
+    "qty_heavy",
+)
+
+# Static statements are built once at import so every call reuses the same
+# object (and SQLAlchemy's compiled-statement cache) instead of re-wrapping SQL.
+SQL_GET_CUSTOMERS = text("SELECT id, customer_name FROM receiving_customers ORDER BY customer_name")
+SQL_GET_EMPLOYEES = text("SELECT id, employee_name FROM receiving_employees ORDER BY employee_name")
+
+# Get-or-insert in one statement. The no-op DO UPDATE makes RETURNING yield the id
+# for existing names too, and it waits on a concurrent insert of the same name
+# instead of coming back empty (which DO NOTHING + a follow-up SELECT can under
+# READ COMMITTED).
+SQL_GET_OR_ADD_CUSTOMER = text(
+    """
+    INSERT INTO receiving_customers (customer_name)
+    VALUES (:name)
+    ON CONFLICT (customer_name) DO UPDATE SET customer_name = EXCLUDED.customer_name
+    RETURNING id
+    """
+)
 
-def init_db():
-    """Create tables if they don't already exist."""
-    eng = get_engine()
-    with eng.begin() as conn:
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS receiving_customers (
-                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                    customer_name TEXT NOT NULL UNIQUE
-                )
-                """
-            )
-        )
+SQL_GET_OR_ADD_EMPLOYEE = text(
+    """
+    INSERT INTO receiving_employees (employee_name)
+    VALUES (:name)
+    ON CONFLICT (employee_name) DO UPDATE SET employee_name = EXCLUDED.employee_name
+    RETURNING id
+    """
+)
 
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS receiving_employees (
-                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                    employee_name TEXT NOT NULL UNIQUE
-                )
-                """
-            )
-        )
+# Bulk adds from the Admin tab: all names in one unnest()ed statement. Existing
+# names are skipped, so RETURNING yields one row per name actually inserted.
+SQL_INSERT_CUSTOMER_NAMES = text(
+    """
+    INSERT INTO receiving_customers (customer_name)
+    SELECT unnest(CAST(:names AS TEXT[]))
+    ON CONFLICT (customer_name) DO NOTHING
+    RETURNING id
+    """
+)
 
-        # Daily "Receiving Data" baseline
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS receiving_daily_actuals (
-                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                    receiving_date DATE NOT NULL,
-                    orders_received INTEGER NOT NULL,
-                    estimated_units INTEGER NOT NULL,
-                    author_name TEXT NOT NULL,
-                    notes TEXT,
-                    date_entered TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    active INTEGER DEFAULT 1
-                )
-                """
-            )
-        )
+SQL_INSERT_EMPLOYEE_NAMES = text(
+    """
+    INSERT INTO receiving_employees (employee_name)
+    SELECT unnest(CAST(:names AS TEXT[]))
+    ON CONFLICT (employee_name) DO NOTHING
+    RETURNING id
+    """
+)
 
-        # Problem tags - header
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS receiving_problem_tags (
-                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                    date_found DATE NOT NULL,
-                    po_number TEXT NOT NULL,
-                    customer_id INTEGER NOT NULL REFERENCES receiving_customers(id),
-                    job_name TEXT NOT NULL,
-                    team_name TEXT NOT NULL,
-                    author_name TEXT NOT NULL,
-                    problem_type TEXT NOT NULL,
-                    mistake_employee_id INTEGER NULL REFERENCES receiving_employees(id),
-                    notes TEXT,
-                    date_entered TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    active INTEGER DEFAULT 1
-                )
-                """
-            )
-        )
+SQL_INSERT_DAILY_ACTUALS = text(
+    """
+    INSERT INTO receiving_daily_actuals (
+        receiving_date, orders_received, estimated_units, author_name, notes
+    )
+    VALUES (:dt, :ord, :est, :auth, :notes)
+    RETURNING id
+    """
+)
 
-        # Problem tags - line items
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS receiving_problem_lines (
-                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                    tag_id INTEGER NOT NULL REFERENCES receiving_problem_tags(id),
-                    short_heavy_tag TEXT,
-                    style_number TEXT NOT NULL,
-                    item_description TEXT NOT NULL,
-                    color TEXT NOT NULL,
-                    size TEXT NOT NULL,
-                    vendor_packing_slip_matches INTEGER,
-                    qty_short INTEGER,
-                    qty_heavy INTEGER
-                )
-                """
-            )
+# Only the columns the Analytics baseline reads
+SQL_FETCH_DAILY_ACTUALS = text(
+    """
+    SELECT
+        receiving_date,
+        estimated_units
+    FROM receiving_daily_actuals
+    WHERE receiving_date BETWEEN :s AND :e
+        AND active = 1
+    ORDER BY receiving_date
+    """
+)
+
+# Receiving Data CSV export: every column for a date window
+SQL_EXPORT_DAILY_ACTUALS = text(
+    """
+    SELECT
+        id,
+        receiving_date,
+        orders_received,
+        estimated_units,
+        author_name,
+        notes,
+        date_entered,
+        active
+    FROM receiving_daily_actuals
+    WHERE receiving_date BETWEEN :s AND :e
+    ORDER BY receiving_date, id
+    """
+)
+
+# Header + all line items in one statement: the lines are passed as parallel
+# arrays and unnest()ed. Data-modifying CTEs always run, so a tag with no lines
+# still gets its header row and id back.
+SQL_INSERT_PROBLEM_TAG = text(
+    """
+    WITH new_tag AS (
+        INSERT INTO receiving_problem_tags (
+            date_found, po_number, customer_id, job_name, team_name,
+            author_name, problem_type, mistake_employee_id, notes
+        )
+        VALUES (
+            :date_found,
+            :po_number,
+            (SELECT id FROM receiving_customers WHERE customer_name = :customer_name),
+            :job_name,
+            :team_name,
+            :author_name,
+            :problem_type,
+            (SELECT id FROM receiving_employees WHERE employee_name = :mistake_employee_name),
+            :notes
         )
+        RETURNING id
+    ),
+    new_lines AS (
+        INSERT INTO receiving_problem_lines (
+            tag_id,
+            short_heavy_tag,
+            style_number,
+            item_description,
+            color,
+            size,
+            vendor_packing_slip_matches,
+            qty_short,
+            qty_heavy
+        )
+        SELECT new_tag.id, v.*
+        FROM new_tag, unnest(
+            CAST(:short_heavy_tag AS TEXT[]),
+            CAST(:style_number AS TEXT[]),
+            CAST(:item_description AS TEXT[]),
+            CAST(:color AS TEXT[]),
+            CAST(:size AS TEXT[]),
+            CAST(:vendor_packing_slip_matches AS INTEGER[]),
+            CAST(:qty_short AS INTEGER[]),
+            CAST(:qty_heavy AS INTEGER[])
+        ) AS v
+    )
+    SELECT id FROM new_tag
+    """
+)
+
+
+@contextmanager
+def use_conn(conn: Connection | None = None):
+    """Yield ``conn`` if the caller already holds one, otherwise check one out of the pool.
+
+    Lets a page run several fetches on a single connection checkout.
+    """
+    if conn is not None:
+        yield conn
+    else:
+        with get_engine().connect() as own_conn:
+            yield own_conn
+
+
+# All schema DDL, sent to Postgres as a single multi-statement batch (one round-trip)
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS receiving_customers (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    customer_name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS receiving_employees (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    employee_name TEXT NOT NULL UNIQUE
+);
+
+-- Daily "Receiving Data" baseline
+CREATE TABLE IF NOT EXISTS receiving_daily_actuals (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    receiving_date DATE NOT NULL,
+    orders_received INTEGER NOT NULL,
+    estimated_units INTEGER NOT NULL,
+    author_name TEXT NOT NULL,
+    notes TEXT,
+    date_entered TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    active INTEGER DEFAULT 1
+);
+
+-- Problem tags - header
+CREATE TABLE IF NOT EXISTS receiving_problem_tags (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    date_found DATE NOT NULL,
+    po_number TEXT NOT NULL,
+    customer_id INTEGER NOT NULL REFERENCES receiving_customers(id),
+    job_name TEXT NOT NULL,
+    team_name TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    problem_type TEXT NOT NULL,
+    mistake_employee_id INTEGER NULL REFERENCES receiving_employees(id),
+    notes TEXT,
+    date_entered TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    active INTEGER DEFAULT 1
+);
+
+-- Problem tags - line items
+CREATE TABLE IF NOT EXISTS receiving_problem_lines (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    tag_id INTEGER NOT NULL REFERENCES receiving_problem_tags(id),
+    short_heavy_tag TEXT,
+    style_number TEXT NOT NULL,
+    item_description TEXT NOT NULL,
+    color TEXT NOT NULL,
+    size TEXT NOT NULL,
+    vendor_packing_slip_matches INTEGER,
+    qty_short INTEGER,
+    qty_heavy INTEGER
+);
+
+-- Indexes for the analytics query: active tags in a date range, optionally by
+-- team or customer, ordered by (date_found, id). Partial on active = 1 so
+-- soft-deleted tags don't bloat them.
+CREATE INDEX IF NOT EXISTS idx_problem_tags_date_found
+    ON receiving_problem_tags (date_found, id) WHERE active = 1;
+
+CREATE INDEX IF NOT EXISTS idx_problem_tags_team_date
+    ON receiving_problem_tags (team_name, date_found) WHERE active = 1;
+
+CREATE INDEX IF NOT EXISTS idx_problem_tags_customer_date
+    ON receiving_problem_tags (customer_id, date_found) WHERE active = 1;
+
+-- tags -> lines join
+CREATE INDEX IF NOT EXISTS idx_problem_lines_tag_id
+    ON receiving_problem_lines (tag_id);
+
+-- Keyset pagination for the Recent Entries table
+CREATE INDEX IF NOT EXISTS idx_daily_actuals_date_id
+    ON receiving_daily_actuals (receiving_date, id);
+
+-- Analytics baseline: active daily actuals in a date range
+CREATE INDEX IF NOT EXISTS idx_daily_actuals_active_date
+    ON receiving_daily_actuals (receiving_date) WHERE active = 1;
+"""
 
 
-def get_customers() -> pd.DataFrame:
+def init_db():
+    """Create tables if they don't already exist.
+
+    Everything goes out in one batch inside one transaction, so this is also
+    the connection check: if it succeeds the database is reachable.
+    """
     eng = get_engine()
-    with eng.connect() as conn:
-        df = pd.read_sql(text("SELECT id, customer_name FROM receiving_customers ORDER BY customer_name"), conn)
-    return df
+    with eng.begin() as conn:
+        # no_parameters sends the text as-is (simple query protocol), which is
+        # what lets psycopg run several statements in one execute
+        conn.exec_driver_sql(SCHEMA_DDL, execution_options={"no_parameters": True})
+
+
+@st.cache_resource(show_spinner=False)
+def _bootstrap() -> bool:
+    """Check connectivity and run schema setup once per process instead of on every rerun.
+
+    Exceptions are not cached, so a failed bootstrap is retried on the next rerun.
+    Pooled connections after that are checked by ``pool_pre_ping``.
+    """
+    init_db()
+    return True
+
 
+@st.cache_data(ttl=300, show_spinner=False)
+def get_lookups() -> tuple[list[tuple[int, str]], list[tuple[int, str]]]:
+    """(customers, employees) as (id, name) rows, both read over one connection.
 
-def get_employees() -> pd.DataFrame:
+    The single cached source for every dropdown, list and name -> id map.
+    """
     eng = get_engine()
     with eng.connect() as conn:
-        df = pd.read_sql(text("SELECT id, employee_name FROM receiving_employees ORDER BY employee_name"), conn)
-    return df
+        customers = conn.execute(SQL_GET_CUSTOMERS).all()
+        employees = conn.execute(SQL_GET_EMPLOYEES).all()
+    return [tuple(r) for r in customers], [tuple(r) for r in employees]
 
 
 def add_customer_if_needed(name: str) -> int:
@@ -179,17 +412,12 @@ def add_customer_if_needed(name: str) -> int:
     eng = get_engine()
     with eng.begin() as conn:
         result = conn.execute(
-            text(
-                """
-                INSERT INTO receiving_customers (customer_name)
-                VALUES (:name)
-                ON CONFLICT (customer_name) DO UPDATE SET customer_name = EXCLUDED.customer_name
-                RETURNING id
-                """
-            ),
+            SQL_GET_OR_ADD_CUSTOMER,
             {"name": name},
         )
         cid = result.scalar_one()
+    # New names must show up in the dropdowns on the next rerun
+    get_lookups.clear()
     return cid
 
 
@@ -200,20 +428,41 @@ def add_employee(name: str) -> int:
     eng = get_engine()
     with eng.begin() as conn:
         result = conn.execute(
-            text(
-                """
-                INSERT INTO receiving_employees (employee_name)
-                VALUES (:name)
-                ON CONFLICT (employee_name) DO UPDATE SET employee_name = EXCLUDED.employee_name
-                RETURNING id
-                """
-            ),
+            SQL_GET_OR_ADD_EMPLOYEE,
             {"name": name},
         )
         eid = result.scalar_one()
+    get_lookups.clear()
     return eid
 
 
+def split_names(raw: str) -> list[str]:
+    """One name per line -> stripped, de-duplicated names in their original order."""
+    return list(dict.fromkeys(n.strip() for n in raw.splitlines() if n.strip()))
+
+
+def add_customers(names: list[str]) -> int:
+    """Insert many customers in one statement. Returns how many were new (existing names are skipped)."""
+    if not names:
+        raise ValueError("Customer name cannot be empty.")
+    eng = get_engine()
+    with eng.begin() as conn:
+        inserted = len(conn.execute(SQL_INSERT_CUSTOMER_NAMES, {"names": names}).all())
+    get_lookups.clear()
+    return inserted
+
+
+def add_employees(names: list[str]) -> int:
+    """Insert many employees in one statement. Returns how many were new (existing names are skipped)."""
+    if not names:
+        raise ValueError("Employee name cannot be empty.")
+    eng = get_engine()
+    with eng.begin() as conn:
+        inserted = len(conn.execute(SQL_INSERT_EMPLOYEE_NAMES, {"names": names}).all())
+    get_lookups.clear()
+    return inserted
+
+
 def save_daily_actuals(
     *,
     receiving_date: date,
@@ -225,15 +474,7 @@ def save_daily_actuals(
     eng = get_engine()
     with eng.begin() as conn:
         res = conn.execute(
-            text(
-                """
-                INSERT INTO receiving_daily_actuals (
-                    receiving_date, orders_received, estimated_units, author_name, notes
-                )
-                VALUES (:dt, :ord, :est, :auth, :notes)
-                RETURNING id
-                """
-            ),
+            SQL_INSERT_DAILY_ACTUALS,
             {
                 "dt": receiving_date,
                 "ord": orders_received,
@@ -242,196 +483,301 @@ def save_daily_actuals(
                 "notes": notes,
             },
         )
-        return res.scalar_one()
+        new_id = res.scalar_one()
+    # Analytics baselines and the export must include the new day on their next rerun
+    fetch_daily_actuals.clear()
+    fetch_customer_agg.clear()
+    export_daily_actuals_csv.clear()
+    return new_id
 
 
-def fetch_daily_actuals(start: date, end: date) -> pd.DataFrame:
+def save_daily_actuals_bulk(rows: list[dict]) -> int:
+    """Backfill many days at once via COPY FROM STDIN. Returns the number of rows loaded.
+
+    Each row needs the same keys as ``save_daily_actuals``'s arguments
+    (``notes`` is optional). The UI keeps using the single-row insert.
+    """
     eng = get_engine()
-    with eng.connect() as conn:
+    with eng.begin() as conn:
+        # COPY is a psycopg-level API, so go through the driver connection
+        # (still inside SQLAlchemy's transaction)
+        with conn.connection.driver_connection.cursor() as cur:
+            with cur.copy(
+                "COPY receiving_daily_actuals "
+                "(receiving_date, orders_received, estimated_units, author_name, notes) FROM STDIN"
+            ) as cp:
+                for r in rows:
+                    cp.write_row(
+                        (
+                            r["receiving_date"],
+                            r["orders_received"],
+                            r["estimated_units"],
+                            r["author_name"],
+                            r.get("notes"),
+                        )
+                    )
+    fetch_daily_actuals.clear()
+    fetch_customer_agg.clear()
+    export_daily_actuals_csv.clear()
+    return len(rows)
+
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def fetch_daily_actuals(start: date, end: date) -> pd.DataFrame:
+    """Active daily actuals in [start, end]. Cached like the problem-tag fetches."""
+    with use_conn() as conn:
         df = pd.read_sql(
-            text(
-                """
-                SELECT
-                    id,
-                    receiving_date,
-                    orders_received,
-                    estimated_units,
-                    author_name,
-                    notes,
-                    date_entered,
-                    active
-                FROM receiving_daily_actuals
-                WHERE receiving_date BETWEEN :s AND :e
-                ORDER BY receiving_date
-                """
-            ),
+            SQL_FETCH_DAILY_ACTUALS,
             conn,
             params={"s": start, "e": end},
+            parse_dates=["receiving_date"],
+            dtype_backend="pyarrow",
         )
-    df["receiving_date"] = pd.to_datetime(df["receiving_date"])
-    df["date_entered"] = pd.to_datetime(df["date_entered"])
     return df
 
 
+def fetch_daily_actuals_page(
+    limit: int | None,
+    before: tuple[date, int] | None = None,
+    through: tuple[date, int] | None = None,
+    conn: Connection | None = None,
+) -> pd.DataFrame:
+    """Newest-first page of daily actuals.
+
+    Keyset pagination on (receiving_date, id): pass the last row of the previous
+    page as ``before`` to get the next one without re-scanning earlier pages, or
+    pass an already-loaded last row as ``through`` (with ``limit=None``) to re-read
+    everything from the newest row down to it.
+    """
+    query = """
+        SELECT
+            id,
+            receiving_date,
+            orders_received,
+            estimated_units,
+            author_name,
+            notes,
+            date_entered,
+            active
+        FROM receiving_daily_actuals
+    """
+    params: dict = {}
+
+    if before is not None:
+        query += " WHERE (receiving_date, id) < (:before_date, :before_id)"
+        params["before_date"], params["before_id"] = before
+    elif through is not None:
+        query += " WHERE (receiving_date, id) >= (:through_date, :through_id)"
+        params["through_date"], params["through_id"] = through
+
+    query += """
+        ORDER BY receiving_date DESC, id DESC
+    """
+
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+
+    with use_conn(conn) as conn:
+        df = pd.read_sql(
+            text(query), conn, params=params, parse_dates=["receiving_date"], dtype_backend="pyarrow"
+        )
+    return df
+
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def export_daily_actuals_csv(start: date, end: date) -> bytes:
+    """CSV bytes of all daily actuals in [start, end], dates as MM/DD/YYYY."""
+    with use_conn() as conn:
+        df = pd.read_sql(
+            SQL_EXPORT_DAILY_ACTUALS,
+            conn,
+            params={"s": start, "e": end},
+            parse_dates=["receiving_date"],
+            dtype_backend="pyarrow",
+        )
+    df["receiving_date"] = df["receiving_date"].dt.strftime("%m/%d/%Y")
+    df["date_entered"] = df["date_entered"].dt.strftime("%m/%d/%Y")
+    return df.to_csv(index=False).encode("utf-8")
+
+
+_PACKING_SLIP = {"Matches Packing Slip": 1, "Does Not Match Packing Slip": 0}
+
+
 def packing_slip_to_bool(val: str | None) -> int | None:
-    if not val:
-        return None
-    if val == "Matches Packing Slip":
-        return 1
-    if val == "Does Not Match Packing Slip":
-        return 0
-    return None
+    return _PACKING_SLIP.get(val) if val else None
 
 
 def save_problem_tag(
     *,
     date_found: date,
     po_number: str,
-    customer_id: int,
+    customer_name: str,
     job_name: str,
     team_name: str,
     author_name: str,
     problem_type: str,
-    mistake_employee_id: int | None,
+    mistake_employee_name: str | None,
     notes: str,
     lines: list[dict],
 ) -> int:
-    """Saves header + line items in a transaction. Returns the new tag_id."""
+    """Saves header + line items in a single round-trip. Returns the new tag_id.
+
+    Customer / employee names are resolved to ids inside the INSERT itself.
+    """
+    params = {
+        "date_found": date_found,
+        "po_number": po_number,
+        "customer_name": customer_name,
+        "job_name": job_name,
+        "team_name": team_name,
+        "author_name": author_name,
+        "problem_type": problem_type,
+        "mistake_employee_name": mistake_employee_name,
+        "notes": notes,
+    }
+    # One array per line column; element i of each array is line i
+    for col in LINE_COLUMNS:
+        params[col] = [ln.get(col) for ln in lines]
+
     eng = get_engine()
     with eng.begin() as conn:
-        tag_id = conn.execute(
-            text(
-                """
-                INSERT INTO receiving_problem_tags (
-                    date_found, po_number, customer_id, job_name, team_name,
-                    author_name, problem_type, mistake_employee_id, notes
-                )
-                VALUES (
-                    :date_found, :po_number, :customer_id, :job_name, :team_name,
-                    :author_name, :problem_type, :mistake_employee_id, :notes
-                )
-                RETURNING id
-                """
-            ),
-            {
-                "date_found": date_found,
-                "po_number": po_number,
-                "customer_id": customer_id,
-                "job_name": job_name,
-                "team_name": team_name,
-                "author_name": author_name,
-                "problem_type": problem_type,
-                "mistake_employee_id": mistake_employee_id,
-                "notes": notes,
-            },
-        ).scalar_one()
-
-        for ln in lines:
-            conn.execute(
-                text(
-                    """
-                    INSERT INTO receiving_problem_lines (
-                        tag_id,
-                        short_heavy_tag,
-                        style_number,
-                        item_description,
-                        color,
-                        size,
-                        vendor_packing_slip_matches,
-                        qty_short,
-                        qty_heavy
-                    )
-                    VALUES (
-                        :tag_id,
-                        :short_heavy_tag,
-                        :style_number,
-                        :item_description,
-                        :color,
-                        :size,
-                        :vendor_packing_slip_matches,
-                        :qty_short,
-                        :qty_heavy
-                    )
-                    """
-                ),
-                {
-                    "tag_id": tag_id,
-                    "short_heavy_tag": ln.get("short_heavy_tag"),
-                    "style_number": ln.get("style_number"),
-                    "item_description": ln.get("item_description"),
-                    "color": ln.get("color"),
-                    "size": ln.get("size"),
-                    "vendor_packing_slip_matches": ln.get("vendor_packing_slip_matches"),
-                    "qty_short": ln.get("qty_short"),
-                    "qty_heavy": ln.get("qty_heavy"),
-                },
-            )
-
+        tag_id = conn.execute(SQL_INSERT_PROBLEM_TAG, params).scalar_one()
+    # Analytics must see the new tag on its next rerun
+    fetch_problem_tag_units.clear()
+    fetch_customer_agg.clear()
     return tag_id
 
 
-def fetch_problem_tags_and_lines(
-    start: date, end: date, team_filter: str | None = None, customer_id: int | None = None
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    """Store CATEGORY_COLUMNS as category dtype (int codes instead of repeated strings)."""
+    for col in CATEGORY_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _problem_tag_filters(team_filter: str | None, customer_id: int | None) -> tuple[str, dict]:
+    """Extra WHERE clauses + params shared by the problem-tag analytics fetches."""
+    clauses = ""
+    params: dict = {}
+
+    if team_filter and team_filter != "-- All --":
+        clauses += " AND t.team_name = :team_name"
+        params["team_name"] = team_filter
+
+    if customer_id is not None:
+        clauses += " AND t.customer_id = :customer_id"
+        params["customer_id"] = customer_id
+
+    return clauses, params
+
+
+def _tag_units_query(filters: str) -> str:
+    """One row per active problem tag in [:start_date, :end_date] with its lines' error units.
+
+    Shared by the tag-level fetch and (as a CTE) the per-customer aggregate so the
+    two can't drift apart. ``filters`` comes from ``_problem_tag_filters``.
+    """
+    return f"""
+        SELECT
+            t.id AS tag_id,
+            t.date_found,
+            c.customer_name,
+            t.team_name,
+            t.problem_type,
+            COALESCE(SUM(COALESCE(l.qty_short, 0) + COALESCE(l.qty_heavy, 0)), 0) AS error_units
+        FROM receiving_problem_tags t
+        JOIN receiving_customers c
+            ON t.customer_id = c.id
+        LEFT JOIN receiving_problem_lines l
+            ON l.tag_id = t.id
+        WHERE
+            t.date_found BETWEEN :start_date AND :end_date
+            AND t.active = 1
+            {filters}
+        GROUP BY t.id, t.date_found, c.customer_name, t.team_name, t.problem_type
+    """
+
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def fetch_problem_tag_units(
+    start: date,
+    end: date,
+    team_filter: str | None = None,
+    customer_id: int | None = None,
 ) -> pd.DataFrame:
-    """Return a wide dataframe joining tags + lines for analytics."""
-    eng = get_engine()
-    with eng.connect() as conn:
-        base_query = """
-            SELECT
-                t.id AS tag_id,
-                t.date_found,
-                t.po_number,
-                t.job_name,
-                t.team_name,
-                t.author_name,
-                t.problem_type,
-                t.notes,
-                t.date_entered,
-                c.customer_name,
-                e.employee_name AS mistake_made_by,
-                l.id AS line_id,
-                l.short_heavy_tag,
-                l.style_number,
-                l.item_description,
-                l.color,
-                l.size,
-                l.vendor_packing_slip_matches,
-                l.qty_short,
-                l.qty_heavy
-            FROM receiving_problem_tags t
-            JOIN receiving_customers c
-                ON t.customer_id = c.id
-            LEFT JOIN receiving_employees e
-                ON t.mistake_employee_id = e.id
-            LEFT JOIN receiving_problem_lines l
-                ON l.tag_id = t.id
-            WHERE
-                t.date_found BETWEEN :start_date AND :end_date
-                AND t.active = 1
-        """
-
-        params: dict = {"start_date": start, "end_date": end}
-
-        if team_filter and team_filter != "-- All --":
-            base_query += " AND t.team_name = :team_name"
-            params["team_name"] = team_filter
-
-        if customer_id is not None:
-            base_query += " AND t.customer_id = :customer_id"
-            params["customer_id"] = customer_id
-
-        base_query += """
-            ORDER BY t.date_found, t.id, l.id
-        """
-
-        df = pd.read_sql(text(base_query), conn, params=params)
-
-    if not df.empty:
-        df["date_found"] = pd.to_datetime(df["date_found"])
-        df["date_entered"] = pd.to_datetime(df["date_entered"])
+    """Return one row per problem tag with its lines' error units summed in SQL.
+
+    Cached per (start, end, team_filter, customer_id); a connection is only
+    checked out on a cache miss. The GROUP BY runs in Postgres so only
+    tag-level rows come back.
+    """
+    filters, params = _problem_tag_filters(team_filter, customer_id)
+    params.update(start_date=start, end_date=end)
+
+    query = _tag_units_query(filters) + """
+        ORDER BY t.date_found, t.id
+    """
+
+    with use_conn() as conn:
+        df = pd.read_sql(
+            text(query), conn, params=params, parse_dates=["date_found"], dtype_backend="pyarrow"
+        )
+    return _categorize(df)
+
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def fetch_customer_agg(
+    start: date,
+    end: date,
+    team_filter: str | None = None,
+    customer_id: int | None = None,
+) -> pd.DataFrame:
+    """Return one row per customer: problem tags, error units, received units, error rate.
+
+    Each tag is matched to the day's total received units (as on the tag-level
+    table), and the per-customer sums and ratio are computed in Postgres.
+    Unsorted; callers order it with ``sort_customer_agg`` so changing the sort
+    doesn't re-run the query.
+    """
+    filters, params = _problem_tag_filters(team_filter, customer_id)
+    params.update(start_date=start, end_date=end)
+
+    # SUM over bigint comes back as numeric; cast so counts stay integers
+    query = f"""
+        WITH daily AS (
+            SELECT receiving_date, SUM(estimated_units) AS total_units
+            FROM receiving_daily_actuals
+            WHERE receiving_date BETWEEN :start_date AND :end_date
+                AND active = 1
+            GROUP BY receiving_date
+        ),
+        tags AS ({_tag_units_query(filters)})
+        SELECT
+            tags.customer_name,
+            COUNT(*) AS orders_with_issue,
+            SUM(tags.error_units)::bigint AS error_units,
+            COALESCE(SUM(d.total_units), 0)::bigint AS total_units,
+            COALESCE(SUM(tags.error_units)::float8 / NULLIF(SUM(d.total_units), 0), 0) AS error_rate
+        FROM tags
+        LEFT JOIN daily d
+            ON d.receiving_date = tags.date_found
+        GROUP BY tags.customer_name
+    """
+
+    with use_conn() as conn:
+        df = pd.read_sql(text(query), conn, params=params, dtype_backend="pyarrow")
+    # Left as plain strings: one row per customer, and chart order must follow the sort
     return df
 
 
+def sort_customer_agg(cust_agg: pd.DataFrame, sort_mode: str) -> pd.DataFrame:
+    """Order ``fetch_customer_agg`` rows by one of CUSTOMER_SORT_ORDER's keys."""
+    by, ascending = CUSTOMER_SORT_ORDER[sort_mode]
+    return cust_agg.sort_values(by, ascending=ascending, ignore_index=True)
+
+
 def default_line() -> dict:
     """Default line dict for the older detailed mode (kept in case you ever want it back)."""
     return {
@@ -455,28 +801,27 @@ def ensure_line_state():
         st.session_state["lines"] = [default_line()]
 
 
+# (header key, error message) for each required submission field
+_REQUIRED_HEADER_FIELDS = (
+    ("date_found", "Date Found is required."),
+    ("customer_name", "Customer is required."),
+    ("problem_type", "Problem Type is required."),
+)
+
+
 def validate_submission(header: dict, total_pieces_with_error: int | None) -> list[str]:
     """Validate the simplified problem tag submission.
 
     We now only *require*:
       - date_found
-      - customer_id
+      - customer_name
       - problem_type
       - total_pieces_with_error (> 0)
 
     Other fields (PO#, job name, team, author) are optional and will be
     defaulted before saving so they satisfy the NOT NULL constraints.
     """
-    errors: list[str] = []
-
-    if not header.get("date_found"):
-        errors.append("Date Found is required.")
-
-    if not header.get("customer_id"):
-        errors.append("Customer is required.")
-
-    if not header.get("problem_type"):
-        errors.append("Problem Type is required.")
+    errors = [msg for key, msg in _REQUIRED_HEADER_FIELDS if not header.get(key)]
 
     if total_pieces_with_error is None or total_pieces_with_error <= 0:
         errors.append("Total pieces with this problem must be greater than 0.")
@@ -489,22 +834,380 @@ def validate_submission(header: dict, total_pieces_with_error: int | None) -> li
 # =============================================================================
 
 
+@st.fragment
+def submission_page():
+    """Problem tag submission tab. A fragment, so saving only reruns this view."""
+    st.header("Problem Tag Submission")
+
+    # If we just saved, show a confirmation and clear the form
+    last_id = st.session_state.pop("problem_tag_form_submitted", None)
+    if last_id is not None:
+        st.success(f"✅ Saved Problem Tag (ID: {last_id})")
+        # Reset the pieces field to its minimum (must happen before the widget is created)
+        st.session_state["total_pieces_with_error"] = 1
+
+    customers, employees = get_lookups()
+    customer_names = [name for _, name in customers]
+    employee_options = ["-- Unknown / Not Set --"] + [name for _, name in employees]
+
+    # Search stays outside the form so it can narrow the dropdown as you type
+    customer_search = st.text_input("Search customers", placeholder="Type to filter…")
+    customer_matches = customer_names
+    if customer_search.strip():
+        needle = customer_search.strip().lower()
+        customer_matches = [name for name in customer_names if needle in name.lower()]
+    customer_options = ["-- Select Customer --"] + customer_matches[:CUSTOMER_DROPDOWN_LIMIT]
+
+    # Widgets inside the form don't trigger reruns until Submit is pressed
+    with st.form("problem_tag_submission"):
+        # --- Core required fields (kept minimal on purpose) ---
+        c1, c2 = st.columns(2)
+        with c1:
+            date_found = st.date_input("Date Found *", value=date.today(), format="MM/DD/YYYY")
+            customer_name = st.selectbox("Customer Name *", customer_options)
+            if len(customer_matches) > CUSTOMER_DROPDOWN_LIMIT:
+                st.caption(
+                    f"Showing first {CUSTOMER_DROPDOWN_LIMIT} of {len(customer_matches):,} customers. "
+                    "Type in the search box to narrow the list."
+                )
+        with c2:
+            problem_type = st.selectbox("Problem Type *", PROBLEM_TYPES)
+            mistake_name = st.selectbox("Mistake Made By (optional)", employee_options)
+
+        total_pieces_with_error = st.number_input(
+            "Total pieces with this problem *",
+            min_value=1,
+            step=1,
+            key="total_pieces_with_error",
+        )
+        # min_value=1 and an int step mean this is always a positive int
+        total_pieces = int(total_pieces_with_error)
+
+        # --- Optional extra context (PO, Job, Team, Author, Notes) ---
+        with st.expander("Optional details (PO, Job, Team, Author, Notes)"):
+            c3, c4 = st.columns(2)
+            with c3:
+                po_number = st.text_input("PO# (optional)", placeholder="e.g., PO-12345")
+                job_name = st.text_input("Job Name (optional)", placeholder="e.g., Spring Promo Kit")
+            with c4:
+                team_name = st.selectbox("Team Name (optional)", TEAM_NAME_OPTIONS)
+                author_name = st.text_input("Author (optional)", placeholder="Who is submitting this?")
+
+            notes = st.text_area(
+                "Notes (optional)",
+                placeholder="Anything helpful about what was found / how it was resolved...",
+            )
+
+        submitted = st.form_submit_button("💾 Submit Problem Tag", type="primary", use_container_width=True)
+
+    # Placeholders mean "not chosen"; ids are resolved by save_problem_tag's INSERT
+    customer_name_val = None if customer_name == "-- Select Customer --" else customer_name
+    mistake_name_val = None if mistake_name == "-- Unknown / Not Set --" else mistake_name
+
+    # Defaults so DB NOT NULL constraints are always satisfied
+    po_number_val = (po_number or "").strip()
+    if not po_number_val:
+        po_number_val = "N/A"
+
+    job_name_val = (job_name or "").strip()
+    if not job_name_val:
+        job_name_val = "Quick Entry"
+
+    team_name_val = team_name
+    if not team_name_val or team_name_val == "-- Auto: Receiving --":
+        team_name_val = "Receiving"
+
+    author_name_val = (author_name or "").strip()
+    if not author_name_val:
+        author_name_val = "Receiving Team"
+
+    header = {
+        "date_found": date_found,
+        "po_number": po_number_val,
+        "customer_name": customer_name_val,
+        "job_name": job_name_val,
+        "team_name": team_name_val,
+        "author_name": author_name_val,
+        "problem_type": problem_type,
+        "mistake_employee_name": mistake_name_val,
+        "notes": notes,
+    }
+
+    # We now store a single generic line where qty_short = total pieces with error.
+    # This feeds the existing analytics (error_units / total_units) without needing SKU-level detail.
+    lines_payload = [
+        {
+            "short_heavy_tag": None,
+            "style_number": "N/A",
+            "item_description": f"Quick entry ({problem_type})",
+            "color": "N/A",
+            "size": "M",
+            "vendor_packing_slip_matches": None,
+            "qty_short": total_pieces,
+            "qty_heavy": None,
+        }
+    ]
+
+    if submitted:
+        errs = validate_submission(header, total_pieces)
+        if errs:
+            st.error("Please fix the following before submitting:")
+            for e in errs:
+                st.write(f"- {e}")
+        else:
+            tag_id = save_problem_tag(
+                date_found=header["date_found"],
+                po_number=header["po_number"],
+                customer_name=header["customer_name"],
+                job_name=header["job_name"],
+                team_name=header["team_name"],
+                author_name=header["author_name"],
+                problem_type=header["problem_type"],
+                mistake_employee_name=header["mistake_employee_name"],
+                notes=header["notes"],
+                lines=lines_payload,
+            )
+            # Flag so we can show success after the fragment rerun and give you a clean form
+            st.session_state["problem_tag_form_submitted"] = tag_id
+            st.rerun(scope="fragment")
+
+
+@st.fragment
+def analytics_page():
+    """Analytics tab. A fragment, so changing its filters only reruns this view."""
+    st.header("Analytics")
+
+    # Options and the name -> id map come from one lookup snapshot, so they always agree
+    customers, _ = get_lookups()
+    customer_ids = {name: cid for cid, name in customers}
+    customer_list = ["-- All --", *customer_ids]
+
+    f1, f2, f3, f4 = st.columns([2, 2, 2, 2])
+    with f1:
+        start_date = st.date_input("Start Date", value=date.today() - timedelta(days=180), format="MM/DD/YYYY", key="ana_sd")
+    with f2:
+        end_date = st.date_input("End Date", value=date.today(), format="MM/DD/YYYY", key="ana_ed")
+    with f3:
+        team_filter = st.selectbox("Team", TEAM_FILTER_OPTIONS, key="ana_team")
+    with f4:
+        cust_filter = st.selectbox("Customer", customer_list, key="ana_cust")
+
+    p1, p2 = st.columns([2, 2])
+    with p1:
+        include_unit_detail = st.checkbox(
+            "Show unit-level detail (error units)",
+            value=True,
+            help="If unchecked, metrics focus only on count of problem tags (orders with issues).",
+        )
+    with p2:
+        sort_mode = st.selectbox("Sort charts by", tuple(CUSTOMER_SORT_ORDER))
+
+    # Map cust_filter back to ID
+    customer_id = None
+    if cust_filter != "-- All --":
+        customer_id = customer_ids[cust_filter]
+
+    # Fetch problem tags (lines already summed per tag in SQL) and the
+    # per-customer aggregate; each cached fetch only connects on a cache miss
+    tag_level = fetch_problem_tag_units(start_date, end_date, team_filter, customer_id)
+    daily_df = fetch_daily_actuals(start_date, end_date)
+    cust_agg = sort_customer_agg(fetch_customer_agg(start_date, end_date, team_filter, customer_id), sort_mode)
+
+    if tag_level.empty and daily_df.empty:
+        st.info("No data found in this date range.")
+        return
+
+    # ---------------------------------------------------------------------
+    # Compute baseline: daily total units
+    # ---------------------------------------------------------------------
+    if daily_df.empty:
+        daily_units = pd.DataFrame(columns=["receiving_date", "total_units"])
+    else:
+        daily_units = (
+            daily_df.groupby("receiving_date", as_index=False)["estimated_units"]
+            .sum()
+            .rename(columns={"receiving_date": "date_found", "estimated_units": "total_units"})
+        )
+
+    # ---------------------------------------------------------------------
+    # Compute problem metrics
+    # ---------------------------------------------------------------------
+    if tag_level.empty:
+        st.warning("No problem tags found in this date range.")
+        return
+
+    # One row per tag ("orders with issues"); error_units is the sum of
+    # 'total pieces with this problem' we captured as qty_short.
+    # Merge with baseline daily units to get error rate
+    tag_level = tag_level.merge(daily_units, on="date_found", how="left")
+    tag_level["total_units"] = tag_level["total_units"].fillna(0)
+
+    tag_level["orders_with_issue"] = 1
+    tag_level["error_rate"] = (tag_level["error_units"] / tag_level["total_units"]).where(
+        tag_level["total_units"] > 0, 0.0
+    )
+
+    # ---------------------------------------------------------------------
+    # Charts
+    # ---------------------------------------------------------------------
+    st.subheader("Customer Error Overview")
+
+    metric_cols = st.columns(4)
+    with metric_cols[0]:
+        total_orders_with_issues = int(tag_level["orders_with_issue"].sum())
+        st.metric("Orders with Issues (tags)", f"{total_orders_with_issues:,}")
+    with metric_cols[1]:
+        total_error_units = int(tag_level["error_units"].sum())
+        st.metric("Error Units (pieces in problem orders)", f"{total_error_units:,}")
+    with metric_cols[2]:
+        total_units_overall = int(daily_units["total_units"].sum())
+        st.metric("Total Units Received", f"{total_units_overall:,}")
+    with metric_cols[3]:
+        if total_units_overall > 0:
+            overall_error_rate = total_error_units / total_units_overall
+        else:
+            overall_error_rate = 0.0
+        st.metric("Overall Error Rate", f"{overall_error_rate:.2%}")
+
+    if not cust_agg.empty:
+        chart_df = cust_agg.head(CHART_CUSTOMER_LIMIT)
+
+        fig1 = px.bar(
+            chart_df,
+            x="customer_name",
+            y="error_rate",
+            title="Error Rate by Customer (error units / total units received)",
+            labels={"customer_name": "Customer", "error_rate": "Error Rate"},
+        )
+        fig1.update_layout(xaxis_tickangle=-45)
+        st.plotly_chart(fig1, use_container_width=True)
+
+        fig2 = px.bar(
+            chart_df,
+            x="customer_name",
+            y="error_units",
+            title="Error Units by Customer (pieces in problem orders)",
+            labels={"customer_name": "Customer", "error_units": "Error Units"},
+        )
+        fig2.update_layout(xaxis_tickangle=-45)
+        st.plotly_chart(fig2, use_container_width=True)
+
+        if len(cust_agg) > CHART_CUSTOMER_LIMIT:
+            st.caption(f"Charts show the top {CHART_CUSTOMER_LIMIT} of {len(cust_agg):,} customers.")
+            with st.expander("All customers"):
+                st.dataframe(cust_agg, use_container_width=True, hide_index=True)
+
+    # ---------------------------------------------------------------------
+    # Detailed table
+    # ---------------------------------------------------------------------
+    st.subheader("Tag-Level Detail (Orders with Issues)")
+
+    # Formatting is left to column_config (client-side) instead of strftime/astype passes
+    tag_level["error_pct"] = tag_level["error_rate"] * 100
+    st.dataframe(
+        tag_level,
+        use_container_width=True,
+        hide_index=True,
+        column_order=(
+            "date_found",
+            "customer_name",
+            "team_name",
+            "problem_type",
+            "orders_with_issue",
+            "error_units",
+            "total_units",
+            "error_pct",
+        ),
+        column_config={
+            "date_found": st.column_config.DateColumn(format="MM/DD/YYYY"),
+            "error_pct": st.column_config.NumberColumn("error_rate", format="%.2f%%"),
+        },
+    )
+
+
+@st.fragment
+def admin_customers_tab():
+    """Admin > Customers. A fragment, so adding names only reruns this tab."""
+    st.subheader("Customers")
+
+    # Shown after the rerun that follows a save (it would be cleared if shown before it)
+    saved_msg = st.session_state.pop("admin_customers_saved", None)
+    if saved_msg:
+        st.success(saved_msg)
+
+    st.dataframe(
+        {"customer_name": [name for _, name in get_lookups()[0]]},
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    new_cust = st.text_area(
+        "Add new customers (one per line)",
+        placeholder="Type or paste customer names…",
+    )
+    if st.button("➕ Add Customer", use_container_width=True):
+        names = split_names(new_cust)
+        if not names:
+            st.error("Customer name cannot be empty.")
+        elif len(names) == 1:
+            cid = add_customer_if_needed(names[0])
+            st.session_state["admin_customers_saved"] = f"Saved (or already existed). ID = {cid}"
+            st.rerun(scope="fragment")
+        else:
+            count = add_customers(names)
+            st.session_state["admin_customers_saved"] = (
+                f"Added {count} new customers ({len(names) - count} already existed)."
+            )
+            st.rerun(scope="fragment")
+
+
+@st.fragment
+def admin_employees_tab():
+    """Admin > Employees. A fragment, so adding names only reruns this tab."""
+    st.subheader("Employees")
+
+    # Shown after the rerun that follows a save (it would be cleared if shown before it)
+    saved_msg = st.session_state.pop("admin_employees_saved", None)
+    if saved_msg:
+        st.success(saved_msg)
+
+    st.dataframe(
+        {"employee_name": [name for _, name in get_lookups()[1]]},
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    new_emp = st.text_area(
+        "Add new employees (one per line)",
+        placeholder="Type or paste employee names…",
+    )
+    if st.button("➕ Add Employee", use_container_width=True):
+        names = split_names(new_emp)
+        if not names:
+            st.error("Employee name cannot be empty.")
+        elif len(names) == 1:
+            add_employee(names[0])
+            st.session_state["admin_employees_saved"] = "Saved (or already existed)."
+            st.rerun(scope="fragment")
+        else:
+            count = add_employees(names)
+            st.session_state["admin_employees_saved"] = (
+                f"Added {count} new employees ({len(names) - count} already existed)."
+            )
+            st.rerun(scope="fragment")
+
+
 def main():
     st.set_page_config(page_title="Receiving KPIs", page_icon="📦", layout="wide")
 
-    # Connection check
+    # Connection check + ensure tables exist (cached, so this only hits the DB once per process)
     try:
-        eng = get_engine()
-        with eng.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        _bootstrap()
     except Exception as e:
         st.error("Could not connect to database. Check secrets['db_url'] or the fallback Neon URL.")
         st.exception(e)
         return
 
-    # Always ensure tables exist
-    init_db()
-
     # Sidebar
     with st.sidebar:
         st.title("Receiving KPIs")
@@ -535,134 +1238,7 @@ def main():
     # 1) SUBMISSION TAB
     # -------------------------------------------------------------------------
     if menu == "📝 Problem Tag Submission":
-        st.header("Problem Tag Submission")
-
-        # If we just saved, show a confirmation and clear the form
-        last_id = st.session_state.pop("problem_tag_form_submitted", None)
-        if last_id is not None:
-            st.success(f"✅ Saved Problem Tag (ID: {last_id})")
-
-        customers_df = get_customers()
-        employees_df = get_employees()
-
-        customer_options = ["-- Select Customer --"] + customers_df["customer_name"].tolist()
-        employee_options = ["-- Unknown / Not Set --"] + employees_df["employee_name"].tolist()
-
-        # --- Core required fields (kept minimal on purpose) ---
-        c1, c2 = st.columns(2)
-        with c1:
-            date_found = st.date_input("Date Found *", value=date.today(), format="MM/DD/YYYY")
-            customer_name = st.selectbox("Customer Name *", customer_options)
-        with c2:
-            problem_type = st.selectbox("Problem Type *", PROBLEM_TYPES)
-            mistake_name = st.selectbox("Mistake Made By (optional)", employee_options)
-
-        total_pieces_with_error = st.number_input(
-            "Total pieces with this problem *",
-            min_value=1,
-            step=1,
-            key="total_pieces_with_error",
-        )
-
-        # --- Optional extra context (PO, Job, Team, Author, Notes) ---
-        with st.expander("Optional details (PO, Job, Team, Author, Notes)"):
-            c3, c4 = st.columns(2)
-            with c3:
-                po_number = st.text_input("PO# (optional)", placeholder="e.g., PO-12345")
-                job_name = st.text_input("Job Name (optional)", placeholder="e.g., Spring Promo Kit")
-            with c4:
-                team_name = st.selectbox("Team Name (optional)", ["-- Auto: Receiving --"] + TEAM_OPTIONS)
-                author_name = st.text_input("Author (optional)", placeholder="Who is submitting this?")
-
-            notes = st.text_area(
-                "Notes (optional)",
-                placeholder="Anything helpful about what was found / how it was resolved...",
-            )
-
-        # Map friendly names back to ids
-        customer_id = None
-        if customer_name != "-- Select Customer --":
-            customer_id = int(
-                customers_df.loc[customers_df["customer_name"] == customer_name, "id"].values[0]
-            )
-
-        mistake_employee_id = None
-        if mistake_name != "-- Unknown / Not Set --":
-            mistake_employee_id = int(
-                employees_df.loc[employees_df["employee_name"] == mistake_name, "id"].values[0]
-            )
-
-        # Defaults so DB NOT NULL constraints are always satisfied
-        po_number_val = (po_number or "").strip()
-        if not po_number_val:
-            po_number_val = "N/A"
-
-        job_name_val = (job_name or "").strip()
-        if not job_name_val:
-            job_name_val = "Quick Entry"
-
-        team_name_val = team_name
-        if not team_name_val or team_name_val == "-- Auto: Receiving --":
-            team_name_val = "Receiving"
-
-        author_name_val = (author_name or "").strip()
-        if not author_name_val:
-            author_name_val = "Receiving Team"
-
-        header = {
-            "date_found": date_found,
-            "po_number": po_number_val,
-            "customer_id": customer_id,
-            "job_name": job_name_val,
-            "team_name": team_name_val,
-            "author_name": author_name_val,
-            "problem_type": problem_type,
-            "mistake_employee_id": mistake_employee_id,
-            "notes": notes,
-        }
-
-        # We now store a single generic line where qty_short = total pieces with error.
-        # This feeds the existing analytics (error_units / total_units) without needing SKU-level detail.
-        lines_payload = [
-            {
-                "short_heavy_tag": None,
-                "style_number": "N/A",
-                "item_description": f"Quick entry ({problem_type})",
-                "color": "N/A",
-                "size": "M",
-                "vendor_packing_slip_matches": None,
-                "qty_short": int(total_pieces_with_error) if total_pieces_with_error else None,
-                "qty_heavy": None,
-            }
-        ]
-
-        if st.button("💾 Submit Problem Tag", type="primary", use_container_width=True):
-            errs = validate_submission(
-                header,
-                int(total_pieces_with_error) if total_pieces_with_error else None,
-            )
-            if errs:
-                st.error("Please fix the following before submitting:")
-                for e in errs:
-                    st.write(f"- {e}")
-            else:
-                tag_id = save_problem_tag(
-                    date_found=header["date_found"],
-                    po_number=header["po_number"],
-                    customer_id=header["customer_id"],
-                    job_name=header["job_name"],
-                    team_name=header["team_name"],
-                    author_name=header["author_name"],
-                    problem_type=header["problem_type"],
-                    mistake_employee_id=header["mistake_employee_id"],
-                    notes=header["notes"],
-                    lines=lines_payload,
-                )
-                # Flag so we can show success after rerun and give you a clean form
-                st.session_state["problem_tag_form_submitted"] = tag_id
-                # Also reset the pieces field to its minimum on next load
-                st.session_state["total_pieces_with_error"] = 1
-                st.rerun()
+        submission_page()
 
     # -------------------------------------------------------------------------
     # 2) RECEIVING DATA (DAILY ACTUALS / BASELINE)
@@ -714,18 +1290,21 @@ def main():
         st.markdown("---")
         st.subheader("Recent Entries")
 
-        recent_start = date.today() - timedelta(days=120)
-        recent_end = date.today()
-        daily_df = fetch_daily_actuals(recent_start, recent_end)
+        # Re-read on every rerun so rows saved by anyone show up; session_state only keeps
+        # keyset cursors: the oldest loaded row once "Load more" has been used, and the row
+        # past which nothing older was found
+        cursor = st.session_state.get("recent_entries_through")
+        if cursor is None:
+            daily_df = fetch_daily_actuals_page(RECENT_ENTRIES_PAGE_SIZE)
+        else:
+            daily_df = fetch_daily_actuals_page(None, through=cursor)
 
         if daily_df.empty:
             st.info("No daily receiving entries yet.")
         else:
-            show_df = daily_df.copy()
-            show_df["receiving_date"] = show_df["receiving_date"].dt.strftime("%m/%d/%Y")
-            show_df["date_entered"] = show_df["date_entered"].dt.strftime("%m/%d/%Y")
+            # Dates are formatted by the frontend, so the frame is shown without a reformatted copy
             st.dataframe(
-                show_df[
+                daily_df[
                     [
                         "receiving_date",
                         "orders_received",
@@ -735,13 +1314,36 @@ def main():
                         "date_entered",
                     ]
                 ],
+                column_config={
+                    "receiving_date": st.column_config.DateColumn(format="MM/DD/YYYY"),
+                    "date_entered": st.column_config.DateColumn(format="MM/DD/YYYY"),
+                },
                 use_container_width=True,
                 hide_index=True,
             )
 
-            csv = show_df.to_csv(index=False).encode("utf-8")
+            # At least a full page loaded means there may be older rows left to fetch, unless
+            # a fetch past this exact row already came back short. Checked against the current
+            # last row each run, so new rows pushing the view down bring the button back.
+            last = daily_df.iloc[-1]
+            last_key = (last["receiving_date"].date(), int(last["id"]))
+            if len(daily_df) >= RECENT_ENTRIES_PAGE_SIZE and st.session_state.get("recent_entries_end") != last_key:
+                if st.button("Load more", key="recent_entries_more"):
+                    next_page = fetch_daily_actuals_page(RECENT_ENTRIES_PAGE_SIZE, before=last_key)
+                    # Anchor the view at its oldest row, even when nothing older came back
+                    oldest_key = last_key
+                    if not next_page.empty:
+                        oldest = next_page.iloc[-1]
+                        oldest_key = (oldest["receiving_date"].date(), int(oldest["id"]))
+                    st.session_state["recent_entries_through"] = oldest_key
+                    if len(next_page) < RECENT_ENTRIES_PAGE_SIZE:
+                        st.session_state["recent_entries_end"] = oldest_key
+                    st.rerun()
+
+            # The export covers the whole window, not just the pages loaded above
+            csv = export_daily_actuals_csv(date.today() - timedelta(days=EXPORT_WINDOW_DAYS), date.today())
             st.download_button(
-                "⬇️ Download Receiving Data CSV",
+                f"⬇️ Download Receiving Data CSV (last {EXPORT_WINDOW_DAYS} days)",
                 data=csv,
                 file_name=f"receiving_daily_actuals_{date.today().strftime('%Y-%m-%d')}.csv",
                 mime="text/csv",
@@ -751,183 +1353,7 @@ def main():
     # 2) ANALYTICS (UPDATED)
     # -------------------------------------------------------------------------
     elif menu == "📊 Analytics":
-        st.header("Analytics")
-
-        customers_df = get_customers()
-        customer_list = ["-- All --"] + customers_df["customer_name"].tolist()
-
-        f1, f2, f3, f4 = st.columns([2, 2, 2, 2])
-        with f1:
-            start_date = st.date_input("Start Date", value=date.today() - timedelta(days=180), format="MM/DD/YYYY", key="ana_sd")
-        with f2:
-            end_date = st.date_input("End Date", value=date.today(), format="MM/DD/YYYY", key="ana_ed")
-        with f3:
-            team_filter = st.selectbox("Team", ["-- All --"] + TEAM_OPTIONS, key="ana_team")
-        with f4:
-            cust_filter = st.selectbox("Customer", customer_list, key="ana_cust")
-
-        p1, p2 = st.columns([2, 2])
-        with p1:
-            include_unit_detail = st.checkbox(
-                "Show unit-level detail (error units)",
-                value=True,
-                help="If unchecked, metrics focus only on count of problem tags (orders with issues).",
-            )
-        with p2:
-            sort_mode = st.selectbox(
-                "Sort charts by",
-                [
-                    "Highest error rate",
-                    "Most error units",
-                    "Most problem tags",
-                    "Customer name",
-                ],
-            )
-
-        # Map cust_filter back to ID
-        customer_id = None
-        if cust_filter != "-- All --":
-            customer_id = int(customers_df.loc[customers_df["customer_name"] == cust_filter, "id"].values[0])
-
-        # Fetch problem tags + lines
-        problems_df = fetch_problem_tags_and_lines(start_date, end_date, team_filter, customer_id)
-        daily_df = fetch_daily_actuals(start_date, end_date)
-
-        if problems_df.empty and daily_df.empty:
-            st.info("No data found in this date range.")
-            return
-
-        # ---------------------------------------------------------------------
-        # Compute baseline: daily total units
-        # ---------------------------------------------------------------------
-        if daily_df.empty:
-            daily_units = pd.DataFrame(columns=["receiving_date", "total_units"])
-        else:
-            daily_units = (
-                daily_df.groupby("receiving_date", as_index=False)["estimated_units"]
-                .sum()
-                .rename(columns={"receiving_date": "date_found", "estimated_units": "total_units"})
-            )
-
-        # ---------------------------------------------------------------------
-        # Compute problem metrics
-        # ---------------------------------------------------------------------
-        if problems_df.empty:
-            st.warning("No problem tags found in this date range.")
-            return
-
-        # Error units (for you now: this is literally the sum of 'total pieces with this problem' we captured as qty_short)
-        problems_df["error_units"] = problems_df[["qty_short", "qty_heavy"]].fillna(0).sum(axis=1)
-
-        # One row per tag to count "orders with issues"
-        tag_level = (
-            problems_df.groupby(
-                ["tag_id", "date_found", "customer_name", "team_name", "problem_type"],
-                as_index=False,
-            )
-            .agg(
-                error_units=("error_units", "sum"),
-            )
-        )
-
-        # Merge with baseline daily units to get error rate
-        tag_level = tag_level.merge(daily_units, on="date_found", how="left")
-        tag_level["total_units"] = tag_level["total_units"].fillna(0)
-
-        tag_level["orders_with_issue"] = 1
-        tag_level["error_rate"] = tag_level.apply(
-            lambda row: (row["error_units"] / row["total_units"]) if row["total_units"] > 0 else 0.0,
-            axis=1,
-        )
-
-        # Aggregate by customer
-        cust_agg = (
-            tag_level.groupby("customer_name", as_index=False)
-            .agg(
-                orders_with_issue=("orders_with_issue", "sum"),
-                error_units=("error_units", "sum"),
-                total_units=("total_units", "sum"),
-            )
-        )
-        cust_agg["error_rate"] = cust_agg.apply(
-            lambda row: (row["error_units"] / row["total_units"]) if row["total_units"] > 0 else 0.0,
-            axis=1,
-        )
-
-        # For charts
-        if sort_mode == "Highest error rate":
-            cust_agg = cust_agg.sort_values("error_rate", ascending=False)
-        elif sort_mode == "Most error units":
-            cust_agg = cust_agg.sort_values("error_units", ascending=False)
-        elif sort_mode == "Most problem tags":
-            cust_agg = cust_agg.sort_values("orders_with_issue", ascending=False)
-        elif sort_mode == "Customer name":
-            cust_agg = cust_agg.sort_values("customer_name", ascending=True)
-
-        # ---------------------------------------------------------------------
-        # Charts
-        # ---------------------------------------------------------------------
-        st.subheader("Customer Error Overview")
-
-        metric_cols = st.columns(4)
-        with metric_cols[0]:
-            total_orders_with_issues = int(tag_level["orders_with_issue"].sum())
-            st.metric("Orders with Issues (tags)", f"{total_orders_with_issues:,}")
-        with metric_cols[1]:
-            total_error_units = int(tag_level["error_units"].sum())
-            st.metric("Error Units (pieces in problem orders)", f"{total_error_units:,}")
-        with metric_cols[2]:
-            total_units_overall = int(daily_units["total_units"].sum())
-            st.metric("Total Units Received", f"{total_units_overall:,}")
-        with metric_cols[3]:
-            if total_units_overall > 0:
-                overall_error_rate = total_error_units / total_units_overall
-            else:
-                overall_error_rate = 0.0
-            st.metric("Overall Error Rate", f"{overall_error_rate:.2%}")
-
-        if not cust_agg.empty:
-            fig1 = px.bar(
-                cust_agg,
-                x="customer_name",
-                y="error_rate",
-                title="Error Rate by Customer (error units / total units received)",
-                labels={"customer_name": "Customer", "error_rate": "Error Rate"},
-            )
-            fig1.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig1, use_container_width=True)
-
-            fig2 = px.bar(
-                cust_agg,
-                x="customer_name",
-                y="error_units",
-                title="Error Units by Customer (pieces in problem orders)",
-                labels={"customer_name": "Customer", "error_units": "Error Units"},
-            )
-            fig2.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig2, use_container_width=True)
-
-        # ---------------------------------------------------------------------
-        # Detailed table
-        # ---------------------------------------------------------------------
-        st.subheader("Tag-Level Detail (Orders with Issues)")
-
-        detail_df = tag_level[
-            [
-                "date_found",
-                "customer_name",
-                "team_name",
-                "problem_type",
-                "orders_with_issue",
-                "error_units",
-                "total_units",
-                "error_rate",
-            ]
-        ].copy()
-        detail_df["date_found"] = detail_df["date_found"].dt.strftime("%m/%d/%Y")
-        detail_df["error_rate"] = (detail_df["error_rate"] * 100).round(2).astype(str) + "%"
-
-        st.dataframe(detail_df, use_container_width=True, hide_index=True)
+        analytics_page()
 
     # -------------------------------------------------------------------------
     # 4) ADMIN (CUSTOMERS, EMPLOYEES)
@@ -938,26 +1364,10 @@ def main():
         tab1, tab2 = st.tabs(["Customers", "Employees"])
 
         with tab1:
-            st.subheader("Customers")
-            customers_df = get_customers()
-            st.dataframe(customers_df[["customer_name"]], use_container_width=True, hide_index=True)
-
-            new_cust = st.text_input("Add new customer", placeholder="Type customer name…")
-            if st.button("➕ Add Customer", use_container_width=True):
-                cid = add_customer_if_needed(new_cust)
-                st.success(f"Saved (or already existed). ID = {cid}")
-                st.rerun()
+            admin_customers_tab()
 
         with tab2:
-            st.subheader("Employees")
-            employees_df = get_employees()
-            st.dataframe(employees_df[["employee_name"]], use_container_width=True, hide_index=True)
-
-            new_emp = st.text_input("Add new employee", placeholder="Type employee name…")
-            if st.button("➕ Add Employee", use_container_width=True):
-                add_employee(new_emp)
-                st.success("Saved (or already existed).")
-                st.rerun()
+            admin_employees_tab()
 
 
 if __name__ == "__main__":